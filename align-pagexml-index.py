@@ -11,25 +11,31 @@ identical accuracy and results.
 """
 
 import re
+import unicodedata
 import csv
 import argparse
 import uuid
 import os
-import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
 from rapidfuzz import process, fuzz
-import difflib
+from rapidfuzz.distance import Levenshtein
 from collections import Counter
 from lxml import etree
 from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TimeElapsedColumn, TimeRemainingColumn
 from rich.console import Console
 
 # --- Normalization ---
+_HEBREW_STRIP = re.compile(r"[^\u0590-\u05FF\s]")  # everything except Hebrew letters + spaces
+
 def normalize_hebrew(text):
-    """Normalize Hebrew text by keeping only Hebrew letters and spaces."""
-    text = re.sub(r"[^\u0590-\u05FF\s]", "", text)  # keep only Hebrew letters + spaces
-    return text.strip()
+    """Normalize Hebrew text by keeping only Hebrew letters and spaces.
+
+    Applies NFC first, so presentation forms like U+FB2A become letter +
+    point instead of being stripped.
+    """
+    return _HEBREW_STRIP.sub("", unicodedata.normalize("NFC", text)).strip()
 
 # --- Build candidate windows ---
 def build_windows(reference_text, window_size):
@@ -37,38 +43,50 @@ def build_windows(reference_text, window_size):
     words = reference_text.split()
     return [" ".join(words[i:i+window_size]) for i in range(len(words)-window_size+1)]
 
-def build_reference_index(reference_text, max_window_size=20):
-    """Pre-build all possible windows for fast lookup (optimization)."""
-    ref_norm = normalize_hebrew(reference_text)
+def build_reference_index(ref_norm, max_window_size=20):
+    """Pre-build all possible windows of a normalized reference for fast lookup (optimization).
+
+    Returns the distinct windows in order of first occurrence and, in
+    parallel, the character offset in ref_norm where each one first starts.
+    """
     words = ref_norm.split()
+    # Character offset of every word (words may be separated by any whitespace)
+    word_offsets = [m.start() for m in re.finditer(r"\S+", ref_norm)]
     
-    # Build all possible window sizes up to max_window_size
-    all_windows = []
+    # Build all possible window sizes up to max_window_size,
+    # keeping each distinct window once with its first position
+    first_offset = {}
     for window_size in range(1, min(max_window_size + 1, len(words) + 1)):
-        windows = build_windows(ref_norm, window_size)
-        all_windows.extend(windows)
+        for i, window in enumerate(build_windows(ref_norm, window_size)):
+            first_offset.setdefault(window, word_offsets[i])
     
-    # Remove duplicates while preserving order
-    return list(dict.fromkeys(all_windows))
+    return list(first_offset), list(first_offset.values())
+
+def prepare_reference(reference_text, verbose=False):
+    """Normalize the reference and pre-build its index once, for any number of files."""
+    ref_norm = normalize_hebrew(reference_text)
+    # Pre-build reference index for faster lookup (optimization)
+    if verbose:
+        print("🔍 Building reference index...")
+    reference_index, offsets = build_reference_index(ref_norm)
+    if verbose:
+        print(f"📚 Index built with {len(reference_index)} candidate windows")
+    return {
+        "ref_norm": ref_norm,
+        "index": reference_index,
+        "offsets": offsets,
+    }
 
 # --- Character-level diff + confusion tracking ---
 def diff_strings(ocr, ref, confusion_log):
     """Track character-level differences between OCR and reference text."""
-    diff = list(difflib.ndiff(ocr, ref))
-    i = 0
-    while i < len(diff):
-        d = diff[i]
-        if d.startswith("-"):
-            if i+1 < len(diff) and diff[i+1].startswith("+"):
-                ocr_char = d[-1]
-                ref_char = diff[i+1][-1]
-                confusion_log.append((ocr_char, ref_char))
-                i += 1
-            else:
-                confusion_log.append((d[-1], ""))  # deletion
-        elif d.startswith("+"):
-            confusion_log.append(("", d[-1]))  # insertion
-        i += 1
+    for op in Levenshtein.editops(ocr, ref):
+        if op.tag == "replace":
+            confusion_log.append((ocr[op.src_pos], ref[op.dest_pos]))
+        elif op.tag == "delete":
+            confusion_log.append((ocr[op.src_pos], ""))  # deletion
+        elif op.tag == "insert":
+            confusion_log.append(("", ref[op.dest_pos]))  # insertion
 
 # PAGE-XML namespace schemas
 PAGE_NAMESPACES = {
@@ -83,66 +101,72 @@ PAGE_NAMESPACES = {
     '2019-07-15': 'http://schema.primaresearch.org/PAGE/gts/pagecontent/2019-07-15'
 }
 
-def detect_page_namespace(xml_path):
-    """Detect the PAGE-XML namespace from the XML file."""
-    try:
-        tree = ET.parse(xml_path)
-        root = tree.getroot()
-        
-        # Extract namespace from the root tag
-        if root.tag.startswith('{'):
-            # Extract namespace from {namespace}tag format
-            namespace = root.tag.split('}')[0][1:]
-            return namespace
-        
-        # Check the xmlns attribute
-        xmlns = root.get('{http://www.w3.org/2000/xmlns/}xmlns')
-        if xmlns:
-            for version, namespace in PAGE_NAMESPACES.items():
-                if namespace in xmlns:
-                    return namespace
-                
-        # Default to most recent namespace
-        return PAGE_NAMESPACES['2019-07-15']
-        
-    except Exception as e:
-        print(f"Warning: Could not detect namespace for {xml_path}: {e}")
-        return PAGE_NAMESPACES['2019-07-15']
+def page_namespace_from_root(root):
+    """Get the PAGE-XML namespace from an already parsed root element."""
+    # Extract namespace from the {namespace}tag format of the root tag
+    namespace = etree.QName(root).namespace
+    if namespace:
+        return namespace
+    
+    # Default to most recent namespace
+    return PAGE_NAMESPACES['2019-07-15']
 
 # --- PAGE-XML Processing ---
+# Drop comments and processing instructions like ElementTree does, so every
+# node under the root is an element
+PAGE_PARSER = etree.XMLParser(remove_comments=True, remove_pis=True)
+
+_PAGE_XPATHS = {}
+
+def page_xpaths(namespace):
+    """Get compiled XPath queries for a PAGE namespace (compiled once per namespace)."""
+    xpaths = _PAGE_XPATHS.get(namespace)
+    if xpaths is None:
+        ns = {'pc': namespace}
+        xpaths = {
+            'textline': etree.XPath('.//pc:TextLine', namespaces=ns),
+            'textequiv': etree.XPath('pc:TextEquiv[1]', namespaces=ns),
+            'unicode': etree.XPath('pc:Unicode[1]', namespaces=ns),
+            'unicode_no_ns': etree.XPath('Unicode[1]'),
+            'lastchange': etree.XPath('pc:LastChange[1]', namespaces=ns),
+        }
+        _PAGE_XPATHS[namespace] = xpaths
+    return xpaths
+
+def first_match(xpath, elem):
+    """Return the first element selected by a compiled XPath, or None."""
+    found = xpath(elem)
+    return found[0] if found else None
+
 def extract_ocr_lines_from_pagexml(xml_path):
     """Extract OCR lines from PAGE-XML file."""
     try:
-        tree = ET.parse(xml_path)
+        tree = etree.parse(xml_path, PAGE_PARSER)
         root = tree.getroot()
         
-        # Detect namespace
-        namespace = detect_page_namespace(xml_path)
+        # Detect namespace from the tree we already have instead of parsing the file again
+        namespace = page_namespace_from_root(root)
         
         ocr_lines = []
+        xpaths = page_xpaths(namespace)
         # Use the detected namespace to find TextLine elements
-        textline_elements = root.findall(f'.//{{{namespace}}}TextLine')
+        textline_elements = xpaths['textline'](root)
         
         for textline in textline_elements:
             # Look for TextEquiv first, then Unicode inside it
-            textequiv_elem = textline.find(f'{{{namespace}}}TextEquiv')
+            textequiv_elem = first_match(xpaths['textequiv'], textline)
             
-            unicode_elem = None
-            if textequiv_elem is not None:
-                # Try both with and without namespace for Unicode
-                unicode_elem = textequiv_elem.find(f'{{{namespace}}}Unicode')
-                if unicode_elem is None:
-                    unicode_elem = textequiv_elem.find('Unicode')
-            else:
-                # Fallback: try to find Unicode directly with and without namespace
-                unicode_elem = textline.find(f'{{{namespace}}}Unicode')
-                if unicode_elem is None:
-                    unicode_elem = textline.find('Unicode')
+            # Try both with and without namespace for Unicode; without a
+            # TextEquiv, fall back to a Unicode directly under the TextLine
+            parent = textequiv_elem if textequiv_elem is not None else textline
+            unicode_elem = first_match(xpaths['unicode'], parent)
+            if unicode_elem is None:
+                unicode_elem = first_match(xpaths['unicode_no_ns'], parent)
             
             if unicode_elem is not None and unicode_elem.text:
                 ocr_lines.append(unicode_elem.text.strip())
         return ocr_lines, tree, root, namespace
-    except ET.ParseError as e:
+    except etree.XMLSyntaxError as e:
         print(f"Error parsing XML file {xml_path}: {e}")
         return [], None, None, None
     except Exception as e:
@@ -152,14 +176,15 @@ def extract_ocr_lines_from_pagexml(xml_path):
 def update_pagexml_with_aligned_text(tree, root, namespace, alignment_results, xml_path, verbose=True):
     """Update PAGE-XML with aligned text, replacing incorrect OCR lines."""
     try:
+        xpaths = page_xpaths(namespace)
         # Use the detected namespace to find TextLine elements
-        textline_elements = root.findall(f'.//{{{namespace}}}TextLine')
+        textline_elements = xpaths['textline'](root)
         
         alignment_idx = 0
         
         for textline in textline_elements:
             # Look for Unicode element using the same namespace
-            unicode_elem = textline.find(f'{{{namespace}}}Unicode')
+            unicode_elem = first_match(xpaths['unicode'], textline)
             
             if unicode_elem is not None and alignment_idx < len(alignment_results):
                 original_text, matched_text, score, _, _ = alignment_results[alignment_idx]
@@ -176,7 +201,7 @@ def update_pagexml_with_aligned_text(tree, root, namespace, alignment_results, x
                 alignment_idx += 1
         
         # Update LastChange timestamp
-        lastchange_elem = root.find(f'{{{namespace}}}LastChange')
+        lastchange_elem = first_match(xpaths['lastchange'], root)
         if lastchange_elem is not None:
             lastchange_elem.text = datetime.now().isoformat()
         
@@ -186,94 +211,75 @@ def update_pagexml_with_aligned_text(tree, root, namespace, alignment_results, x
         return tree
 
 def write_xml_without_namespace_prefixes(tree, output_path):
-    """Write XML without namespace prefixes using proper lxml approach - NO REGEX."""
-    # Convert ElementTree to lxml
+    """Write XML without namespace prefixes using proper lxml approach - NO REGEX.
+
+    Element tags are renamed in place (the tree is modified) instead of
+    copying the whole document into a new tree.
+    """
     root = tree.getroot()
+    namespace = etree.QName(root).namespace
     
-    # Extract namespace from the original tag
-    namespace = None
-    if '}' in root.tag:
-        namespace = root.tag.split('}')[0][1:]
-    
-    # Create a new lxml element with the same tag name but without namespace
-    new_root = etree.Element(root.tag.split('}')[-1] if '}' in root.tag else root.tag)
+    # Remove namespace prefixes from element names
+    for elem in root.iter():
+        if '}' in elem.tag:
+            elem.tag = elem.tag.split('}', 1)[1]
+    etree.cleanup_namespaces(root)
     
-    # Set the main xmlns attribute first
+    # Set the main xmlns attribute first, keeping all other attributes exactly as they are
     if namespace:
-        new_root.set('xmlns', namespace)
-    
-    # Copy all other attributes exactly as they are
-    for key, value in root.attrib.items():
-        new_root.set(key, value)
-    
-    # Copy all children recursively, removing namespace prefixes from element names
-    def copy_element(src, dest):
-        for child in src:
-            # Get the element name without namespace
-            if '}' in child.tag:
-                new_tag = child.tag.split('}')[-1]
-            else:
-                new_tag = child.tag
-            
-            new_child = etree.SubElement(dest, new_tag)
-            
-            # Copy ALL attributes exactly as they are
-            for key, value in child.attrib.items():
-                new_child.set(key, value)
-            
-            # Copy text content
-            if child.text:
-                new_child.text = child.text
-            if child.tail:
-                new_child.tail = child.tail
-            
-            # Recursively copy children
-            copy_element(child, new_child)
-    
-    copy_element(root, new_root)
+        attributes = list(root.attrib.items())
+        root.attrib.clear()
+        root.set('xmlns', namespace)
+        for key, value in attributes:
+            root.set(key, value)
     
     # Write to file with proper formatting
     with open(output_path, 'w', encoding='utf-8') as f:
         f.write('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n')
-        f.write(etree.tostring(new_root, encoding='unicode', pretty_print=True))
+        f.write(etree.tostring(root, encoding='unicode', pretty_print=True))
 
 # --- Align OCR lines ---
-def align_ocr_lines(ocr_lines, reference_text, outdir, threshold=70, verbose=True):
-    """Align OCR lines with reference text using fuzzy matching with pre-indexing optimization."""
+def align_ocr_lines(ocr_lines, reference_text, outdir, threshold=70, verbose=True, reference=None):
+    """Align OCR lines with reference text using fuzzy matching with pre-indexing optimization.
+
+    Pass a reference from prepare_reference() to reuse its normalized text and
+    index; reference_text is then ignored.
+    """
     os.makedirs(outdir, exist_ok=True)
-    ref_norm = normalize_hebrew(reference_text)
+    if reference is None:
+        reference = prepare_reference(reference_text, verbose)
+    reference_index = reference["index"]
+    offsets = reference["offsets"]
     results = []
     confusion_log = []
 
-    # Pre-build reference index for faster lookup (optimization)
-    if verbose:
-        print("🔍 Building reference index...")
-    reference_index = build_reference_index(reference_text)
-    if verbose:
-        print(f"📚 Index built with {len(reference_index)} candidate windows")
-
     uid = uuid.uuid4().hex[:8]
     csv_path = os.path.join(outdir, f"alignment_{uid}.csv")
     txt_path = os.path.join(outdir, f"alignment_{uid}.txt")
     confusion_path = os.path.join(outdir, f"confusions_{uid}.csv")
 
-    with open(csv_path, "w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow(["OCR Line", "Best Match", "Score", "Start Index", "Final Match"])
+    norm_lines = [normalize_hebrew(line) for line in ocr_lines]
 
-        for line in ocr_lines:
-            norm_line = normalize_hebrew(line)
-            
-            # Use pre-built index for fast lookup
-            match, score, idx = process.extractOne(norm_line, reference_index, scorer=fuzz.ratio)
-            start_index = ref_norm.find(match)
+    for line, norm_line in zip(ocr_lines, norm_lines):
+        # Use pre-built index for fast lookup; the cutoff lets RapidFuzz skip
+        # hopeless windows, with an uncut search for lines below the threshold
+        match, score, idx = (
+            process.extractOne(norm_line, reference_index, scorer=fuzz.ratio, processor=None, score_cutoff=threshold)
+            or process.extractOne(norm_line, reference_index, scorer=fuzz.ratio, processor=None)
+        )
+        start_index = offsets[idx]
 
-            # Track confusions
-            diff_strings(line, match, confusion_log)
+        # Track confusions (the match is normalized, so diff the normalized line)
+        diff_strings(norm_line, match, confusion_log)
 
-            final_match = match
-            results.append((line, match, score, start_index, final_match))
-            writer.writerow([line, match, score, start_index, final_match])
+        final_match = match
+        results.append((line, match, score, start_index, final_match))
+
+    # Save alignment log in one go once all lines are aligned
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["OCR Line", "Best Match", "Score", "Start Index", "Final Match"])
+        writer.writerows(results)
 
     # Save matched text
     with open(txt_path, "w", encoding="utf-8") as f:
@@ -281,11 +287,11 @@ def align_ocr_lines(ocr_lines, reference_text, outdir, threshold=70, verbose=Tru
             f.write(final_match + "\n")
 
     # Save confusion stats
-    confusion_counts = Counter(confusion_log)
+    confusion_counts = Counter(confusion_log).most_common()  # sorted once, reused for the report
     with open(confusion_path, "w", newline="", encoding="utf-8") as f:
         writer = csv.writer(f)
         writer.writerow(["Confused Char", "Confused With", "Count"])
-        for (c, cw), count in confusion_counts.most_common():
+        for (c, cw), count in confusion_counts:
             writer.writerow([c, cw, count])
 
     # --- Summary Report ---
@@ -301,12 +307,12 @@ def align_ocr_lines(ocr_lines, reference_text, outdir, threshold=70, verbose=Tru
         print(f"- Low-confidence (<{threshold}): {low_conf} lines ({low_conf_pct:.1f}%)")
 
         print("\n🔝 Top 5 Confusions:")
-        for (c, cw), count in confusion_counts.most_common(5):
+        for (c, cw), count in confusion_counts[:5]:
             print(f"  {c or '∅'} → {cw or '∅'} : {count} times")
 
     return results, csv_path, txt_path, confusion_path
 
-def process_pagexml_file(xml_path, reference_text, output_dir, threshold=70, verbose=True):
+def process_pagexml_file(xml_path, reference_text, output_dir, threshold=70, verbose=True, reference=None):
     """Process a single PAGE-XML file."""
     if verbose:
         print(f"\n🔄 Processing: {xml_path}")
@@ -325,7 +331,7 @@ def process_pagexml_file(xml_path, reference_text, output_dir, threshold=70, ver
     
     # Align OCR lines
     alignment_results, csv_path, txt_path, confusion_path = align_ocr_lines(
-        ocr_lines, reference_text, output_dir, threshold, verbose
+        ocr_lines, reference_text, output_dir, threshold, verbose, reference
     )
     
     # Update PAGE-XML with aligned text
@@ -353,14 +359,29 @@ def process_pagexml_file(xml_path, reference_text, output_dir, threshold=70, ver
     
     return None
 
+# --- Parallel batch processing ---
+_worker_reference = None
+
+def _init_worker(reference):
+    """Receive the prepared reference once per worker process instead of once per file."""
+    global _worker_reference
+    _worker_reference = reference
+
+def _process_pagexml_file_in_worker(xml_path, output_dir, threshold):
+    """Process a single PAGE-XML file inside a worker process."""
+    return process_pagexml_file(xml_path, None, output_dir, threshold, verbose=False, reference=_worker_reference)
+
 def process_pagexml_directory(input_path, reference_text, output_dir, threshold=70):
     """Process a directory of PAGE-XML files."""
     input_path = Path(input_path)
     console = Console()
     
+    # Normalize the reference once for every file instead of once per file
+    reference = prepare_reference(reference_text, verbose=input_path.is_file())
+    
     if input_path.is_file():
         # Single file - use verbose output
-        return [process_pagexml_file(str(input_path), reference_text, output_dir, threshold, verbose=True)]
+        return [process_pagexml_file(str(input_path), None, output_dir, threshold, verbose=True, reference=reference)]
     
     xml_files = list(input_path.glob("*.xml"))
     if not xml_files:
@@ -377,15 +398,35 @@ def process_pagexml_directory(input_path, reference_text, output_dir, threshold=
         TimeElapsedColumn(),
         TimeRemainingColumn(),
         console=console,
+        refresh_per_second=4,
+        transient=True,
     ) as progress:
         task = progress.add_task("Processing PAGE-XML files...", total=len(xml_files))
         
+        # Files are independent, so align them in parallel and advance the bar as each completes
+        file_results = {}
+        with ProcessPoolExecutor(
+            max_workers=min(len(xml_files), os.cpu_count() or 1),
+            initializer=_init_worker,
+            initargs=(reference,),
+        ) as executor:
+            futures = {
+                executor.submit(_process_pagexml_file_in_worker, str(xml_file), output_dir, threshold): xml_file
+                for xml_file in xml_files
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                xml_file = futures[future]
+                file_results[xml_file] = future.result()
+                # Only rename the task every few files; the bar itself advances on every completion
+                if done % 10 == 0 or done == len(xml_files):
+                    progress.update(task, advance=1, description=f"Processed {xml_file.name}")
+                else:
+                    progress.update(task, advance=1)
+
+        # Keep results in input order regardless of completion order
         for xml_file in xml_files:
-            progress.update(task, description=f"Processing {xml_file.name}")
-            result = process_pagexml_file(str(xml_file), reference_text, output_dir, threshold, verbose=False)
-            if result:
-                results.append(result)
-            progress.advance(task)
+            if file_results[xml_file]:
+                results.append(file_results[xml_file])
     
     return results
 
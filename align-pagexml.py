@@ -7,50 +7,58 @@ replacing incorrect OCR lines with their best matches from the reference.
 """
 
 import re
+import unicodedata
 import csv
 import argparse
 import uuid
 import os
-import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
-from rapidfuzz import process, fuzz
-import difflib
+import numpy as np
+from rapidfuzz import fuzz
+from rapidfuzz.process import cdist
+from rapidfuzz.distance import Levenshtein
 from collections import Counter
 from lxml import etree
 from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TimeElapsedColumn, TimeRemainingColumn
 from rich.console import Console
 
 # --- Normalization ---
+_HEBREW_STRIP = re.compile(r"[^\u0590-\u05FF\s]")  # everything except Hebrew letters + spaces
+
 def normalize_hebrew(text):
-    """Normalize Hebrew text by keeping only Hebrew letters and spaces."""
-    text = re.sub(r"[^\u0590-\u05FF\s]", "", text)  # keep only Hebrew letters + spaces
-    return text.strip()
+    """Normalize Hebrew text by keeping only Hebrew letters and spaces.
+
+    Applies NFC first, so presentation forms like U+FB2A become letter +
+    point instead of being stripped.
+    """
+    return _HEBREW_STRIP.sub("", unicodedata.normalize("NFC", text)).strip()
 
 # --- Build candidate windows ---
-def build_windows(reference_text, window_size):
-    """Build sliding windows of words from reference text."""
-    words = reference_text.split()
-    return [" ".join(words[i:i+window_size]) for i in range(len(words)-window_size+1)]
+def build_unique_windows(words, window_size):
+    """Build the distinct windows of one size, in order of first occurrence.
+
+    Returns the window strings and, in parallel, the index of the word each
+    window first starts at. Windows of different sizes never collide (they
+    differ in word count), so lists for several sizes can be concatenated
+    without further deduplication.
+    """
+    first_word = {}
+    for i in range(len(words)-window_size+1):
+        first_word.setdefault(" ".join(words[i:i+window_size]), i)
+    return list(first_word), list(first_word.values())
 
 # --- Character-level diff + confusion tracking ---
 def diff_strings(ocr, ref, confusion_log):
     """Track character-level differences between OCR and reference text."""
-    diff = list(difflib.ndiff(ocr, ref))
-    i = 0
-    while i < len(diff):
-        d = diff[i]
-        if d.startswith("-"):
-            if i+1 < len(diff) and diff[i+1].startswith("+"):
-                ocr_char = d[-1]
-                ref_char = diff[i+1][-1]
-                confusion_log.append((ocr_char, ref_char))
-                i += 1
-            else:
-                confusion_log.append((d[-1], ""))  # deletion
-        elif d.startswith("+"):
-            confusion_log.append(("", d[-1]))  # insertion
-        i += 1
+    for op in Levenshtein.editops(ocr, ref):
+        if op.tag == "replace":
+            confusion_log.append((ocr[op.src_pos], ref[op.dest_pos]))
+        elif op.tag == "delete":
+            confusion_log.append((ocr[op.src_pos], ""))  # deletion
+        elif op.tag == "insert":
+            confusion_log.append(("", ref[op.dest_pos]))  # insertion
 
 # PAGE-XML namespace schemas
 PAGE_NAMESPACES = {
@@ -65,66 +73,72 @@ PAGE_NAMESPACES = {
     '2019-07-15': 'http://schema.primaresearch.org/PAGE/gts/pagecontent/2019-07-15'
 }
 
-def detect_page_namespace(xml_path):
-    """Detect the PAGE-XML namespace from the XML file."""
-    try:
-        tree = ET.parse(xml_path)
-        root = tree.getroot()
-        
-        # Extract namespace from the root tag
-        if root.tag.startswith('{'):
-            # Extract namespace from {namespace}tag format
-            namespace = root.tag.split('}')[0][1:]
-            return namespace
-        
-        # Check the xmlns attribute
-        xmlns = root.get('{http://www.w3.org/2000/xmlns/}xmlns')
-        if xmlns:
-            for version, namespace in PAGE_NAMESPACES.items():
-                if namespace in xmlns:
-                    return namespace
-                
-        # Default to most recent namespace
-        return PAGE_NAMESPACES['2019-07-15']
-        
-    except Exception as e:
-        print(f"Warning: Could not detect namespace for {xml_path}: {e}")
-        return PAGE_NAMESPACES['2019-07-15']
+def page_namespace_from_root(root):
+    """Get the PAGE-XML namespace from an already parsed root element."""
+    # Extract namespace from the {namespace}tag format of the root tag
+    namespace = etree.QName(root).namespace
+    if namespace:
+        return namespace
+    
+    # Default to most recent namespace
+    return PAGE_NAMESPACES['2019-07-15']
 
 # --- PAGE-XML Processing ---
+# Drop comments and processing instructions like ElementTree does, so every
+# node under the root is an element
+PAGE_PARSER = etree.XMLParser(remove_comments=True, remove_pis=True)
+
+_PAGE_XPATHS = {}
+
+def page_xpaths(namespace):
+    """Get compiled XPath queries for a PAGE namespace (compiled once per namespace)."""
+    xpaths = _PAGE_XPATHS.get(namespace)
+    if xpaths is None:
+        ns = {'pc': namespace}
+        xpaths = {
+            'textline': etree.XPath('.//pc:TextLine', namespaces=ns),
+            'textequiv': etree.XPath('pc:TextEquiv[1]', namespaces=ns),
+            'unicode': etree.XPath('pc:Unicode[1]', namespaces=ns),
+            'unicode_no_ns': etree.XPath('Unicode[1]'),
+            'lastchange': etree.XPath('pc:LastChange[1]', namespaces=ns),
+        }
+        _PAGE_XPATHS[namespace] = xpaths
+    return xpaths
+
+def first_match(xpath, elem):
+    """Return the first element selected by a compiled XPath, or None."""
+    found = xpath(elem)
+    return found[0] if found else None
+
 def extract_ocr_lines_from_pagexml(xml_path):
     """Extract OCR lines from PAGE-XML file."""
     try:
-        tree = ET.parse(xml_path)
+        tree = etree.parse(xml_path, PAGE_PARSER)
         root = tree.getroot()
         
-        # Detect namespace
-        namespace = detect_page_namespace(xml_path)
+        # Detect namespace from the tree we already have instead of parsing the file again
+        namespace = page_namespace_from_root(root)
         
         ocr_lines = []
+        xpaths = page_xpaths(namespace)
         # Use the detected namespace to find TextLine elements
-        textline_elements = root.findall(f'.//{{{namespace}}}TextLine')
+        textline_elements = xpaths['textline'](root)
         
         for textline in textline_elements:
             # Look for TextEquiv first, then Unicode inside it
-            textequiv_elem = textline.find(f'{{{namespace}}}TextEquiv')
+            textequiv_elem = first_match(xpaths['textequiv'], textline)
             
-            unicode_elem = None
-            if textequiv_elem is not None:
-                # Try both with and without namespace for Unicode
-                unicode_elem = textequiv_elem.find(f'{{{namespace}}}Unicode')
-                if unicode_elem is None:
-                    unicode_elem = textequiv_elem.find('Unicode')
-            else:
-                # Fallback: try to find Unicode directly with and without namespace
-                unicode_elem = textline.find(f'{{{namespace}}}Unicode')
-                if unicode_elem is None:
-                    unicode_elem = textline.find('Unicode')
+            # Try both with and without namespace for Unicode; without a
+            # TextEquiv, fall back to a Unicode directly under the TextLine
+            parent = textequiv_elem if textequiv_elem is not None else textline
+            unicode_elem = first_match(xpaths['unicode'], parent)
+            if unicode_elem is None:
+                unicode_elem = first_match(xpaths['unicode_no_ns'], parent)
             
             if unicode_elem is not None and unicode_elem.text:
                 ocr_lines.append(unicode_elem.text.strip())
         return ocr_lines, tree, root, namespace
-    except ET.ParseError as e:
+    except etree.XMLSyntaxError as e:
         print(f"Error parsing XML file {xml_path}: {e}")
         return [], None, None, None
     except Exception as e:
@@ -134,14 +148,15 @@ def extract_ocr_lines_from_pagexml(xml_path):
 def update_pagexml_with_aligned_text(tree, root, namespace, alignment_results, xml_path, verbose=True):
     """Update PAGE-XML with aligned text, replacing incorrect OCR lines."""
     try:
+        xpaths = page_xpaths(namespace)
         # Use the detected namespace to find TextLine elements
-        textline_elements = root.findall(f'.//{{{namespace}}}TextLine')
+        textline_elements = xpaths['textline'](root)
         
         alignment_idx = 0
         
         for textline in textline_elements:
             # Look for Unicode element using the same namespace
-            unicode_elem = textline.find(f'{{{namespace}}}Unicode')
+            unicode_elem = first_match(xpaths['unicode'], textline)
             
             if unicode_elem is not None and alignment_idx < len(alignment_results):
                 original_text, matched_text, score, _, _ = alignment_results[alignment_idx]
@@ -158,7 +173,7 @@ def update_pagexml_with_aligned_text(tree, root, namespace, alignment_results, x
                 alignment_idx += 1
         
         # Update LastChange timestamp
-        lastchange_elem = root.find(f'{{{namespace}}}LastChange')
+        lastchange_elem = first_match(xpaths['lastchange'], root)
         if lastchange_elem is not None:
             lastchange_elem.text = datetime.now().isoformat()
         
@@ -168,62 +183,199 @@ def update_pagexml_with_aligned_text(tree, root, namespace, alignment_results, x
         return tree
 
 def write_xml_without_namespace_prefixes(tree, output_path):
-    """Write XML without namespace prefixes using proper lxml approach - NO REGEX."""
-    # Convert ElementTree to lxml
+    """Write XML without namespace prefixes using proper lxml approach - NO REGEX.
+
+    Element tags are renamed in place (the tree is modified) instead of
+    copying the whole document into a new tree.
+    """
     root = tree.getroot()
+    namespace = etree.QName(root).namespace
     
-    # Extract namespace from the original tag
-    namespace = None
-    if '}' in root.tag:
-        namespace = root.tag.split('}')[0][1:]
-    
-    # Create a new lxml element with the same tag name but without namespace
-    new_root = etree.Element(root.tag.split('}')[-1] if '}' in root.tag else root.tag)
+    # Remove namespace prefixes from element names
+    for elem in root.iter():
+        if '}' in elem.tag:
+            elem.tag = elem.tag.split('}', 1)[1]
+    etree.cleanup_namespaces(root)
     
-    # Set the main xmlns attribute first
+    # Set the main xmlns attribute first, keeping all other attributes exactly as they are
     if namespace:
-        new_root.set('xmlns', namespace)
-    
-    # Copy all other attributes exactly as they are
-    for key, value in root.attrib.items():
-        new_root.set(key, value)
-    
-    # Copy all children recursively, removing namespace prefixes from element names
-    def copy_element(src, dest):
-        for child in src:
-            # Get the element name without namespace
-            if '}' in child.tag:
-                new_tag = child.tag.split('}')[-1]
-            else:
-                new_tag = child.tag
-            
-            new_child = etree.SubElement(dest, new_tag)
-            
-            # Copy ALL attributes exactly as they are
-            for key, value in child.attrib.items():
-                new_child.set(key, value)
-            
-            # Copy text content
-            if child.text:
-                new_child.text = child.text
-            if child.tail:
-                new_child.tail = child.tail
-            
-            # Recursively copy children
-            copy_element(child, new_child)
-    
-    copy_element(root, new_root)
+        attributes = list(root.attrib.items())
+        root.attrib.clear()
+        root.set('xmlns', namespace)
+        for key, value in attributes:
+            root.set(key, value)
     
     # Write to file with proper formatting
     with open(output_path, 'w', encoding='utf-8') as f:
         f.write('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n')
-        f.write(etree.tostring(new_root, encoding='unicode', pretty_print=True))
+        f.write(etree.tostring(root, encoding='unicode', pretty_print=True))
+
+# --- Bag-of-letters prefilter ---
+# Every insertion or deletion changes one letter count by one, so the L1
+# distance between two letter histograms is a lower bound on their Indel
+# distance and gives an upper bound on fuzz.ratio without running the scorer.
+# Final forms get their own bins; space and "anything else" get one bin each.
+HEBREW_LETTERS = "אבגדהוזחטיךכלםמןנסעףפץצקרשת"
+SPACE_BIN = len(HEBREW_LETTERS)
+OTHER_BIN = SPACE_BIN + 1
+N_BINS = OTHER_BIN + 1
+PREFILTER_TOP_K = 64              # windows scored first to seed the best score
+PREFILTER_MIN_CANDIDATES = 4096   # smaller candidate lists are cheaper to score in full
+
+_HEBREW_BLOCK_BINS = np.full(0x70, OTHER_BIN, dtype=np.intp)  # U+0590..U+05FF -> bin
+for _bin, _letter in enumerate(HEBREW_LETTERS):
+    _HEBREW_BLOCK_BINS[ord(_letter) - 0x0590] = _bin
+
+def letter_bins(text):
+    """Map every character of text to its letter histogram bin."""
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+    bins = np.full(len(codes), OTHER_BIN, dtype=np.intp)
+    in_block = (codes >= 0x0590) & (codes < 0x0600)
+    bins[in_block] = _HEBREW_BLOCK_BINS[codes[in_block] - 0x0590]
+    bins[codes == 0x20] = SPACE_BIN
+    return bins
+
+def cumulative_letter_counts(words):
+    """Running letter histograms over words.
+
+    Row i+s minus row i is the histogram of words[i:i+s], without the spaces
+    that join them.
+    """
+    word_ids = np.repeat(np.arange(len(words)), [len(w) for w in words])
+    counts = np.bincount(word_ids * N_BINS + letter_bins("".join(words)), minlength=len(words) * N_BINS)
+    cumulative = np.zeros((len(words) + 1, N_BINS), dtype=np.int32)
+    np.cumsum(counts.reshape(len(words), N_BINS), axis=0, out=cumulative[1:])
+    return cumulative
+
+def window_letter_counts(cumulative, first_word, window_size):
+    """Letter histograms of windows, one column per window (bins x windows)."""
+    starts = np.asarray(first_word, dtype=np.intp)
+    counts = cumulative[starts + window_size] - cumulative[starts]
+    counts[:, SPACE_BIN] += window_size - 1
+    return np.ascontiguousarray(counts.T, dtype=np.int16)
+
+def best_candidate_prefiltered(query, candidates, candidate_counts, candidate_lengths):
+    """Index of the best candidate for query, scoring only windows that can still win.
+
+    The top PREFILTER_TOP_K windows by bag-of-letters bound are scored first;
+    any window whose bound is below that score cannot win and is skipped. The
+    result is the same as scoring every candidate, including ties resolving to
+    the first candidate.
+    """
+    query_counts = np.bincount(letter_bins(query), minlength=N_BINS).astype(np.int16)
+    distance = np.zeros(len(candidates), dtype=np.int16)
+    for b in range(N_BINS):
+        distance += np.abs(candidate_counts[b] - query_counts[b])
+    bound = 100 * (1 - distance / (candidate_lengths + len(query)))
+
+    # Only a handful of windows are scored here, too few to be worth cdist threads
+    top = np.argpartition(bound, -PREFILTER_TOP_K)[-PREFILTER_TOP_K:]
+    best = cdist([query], [candidates[j] for j in top], scorer=fuzz.ratio, processor=None,
+                 workers=1, dtype=np.float64).max()
+
+    survivors = np.flatnonzero(bound >= best - 1e-6)
+    scores = cdist([query], [candidates[j] for j in survivors], scorer=fuzz.ratio, processor=None,
+                   workers=1, dtype=np.float64)[0]
+    return survivors[scores.argmax()]
+
+# --- Batched fuzzy matching ---
+CDIST_BATCH_SIZE = 64  # OCR lines scored per cdist call (bounds the score matrix size)
+CDIST_WORKERS = -1     # threads used by cdist (-1 = all cores)
+
+def prepare_reference(reference_text):
+    """Normalize the reference once and set up its per-size window cache.
+
+    The prepared reference can be reused for any number of files; windows are
+    added to its cache the first time a window size is needed.
+    """
+    ref_norm = normalize_hebrew(reference_text)
+    words = ref_norm.split()
+    return {
+        "ref_norm": ref_norm,
+        "words": words,
+        # Character offset of every word, so a window's position is known without
+        # searching ref_norm for it (words may be separated by any whitespace)
+        "word_offsets": [m.start() for m in re.finditer(r"\S+", ref_norm)],
+        "letter_counts": cumulative_letter_counts(words),
+        "windows": {},  # window size -> distinct windows, see get_windows()
+    }
+
+def get_windows(reference, window_size):
+    """Get the distinct windows of one size from the reference's cache, building them once.
+
+    Each entry holds the window strings, the word each first starts at, their
+    letter histograms (one column per window) and their lengths.
+    """
+    windows = reference["windows"].get(window_size)
+    if windows is None:
+        text, first_word = build_unique_windows(reference["words"], window_size)
+        counts = window_letter_counts(reference["letter_counts"], first_word, window_size)
+        windows = {
+            "text": text,
+            "first_word": first_word,
+            "letter_counts": counts,
+            "length": counts.sum(axis=0, dtype=np.int32),
+        }
+        reference["windows"][window_size] = windows
+    return windows
+
+def best_matches(norm_lines, reference, score_cutoff=0):
+    """Find the best reference window for every normalized OCR line.
+
+    Lines with the same token count share the same candidate windows
+    (base-1, base, base+1), so each group is scored with batched cdist calls.
+    Large candidate lists go through the bag-of-letters prefilter line by line
+    instead. Returns (match, score, start index in ref_norm) per line. Scores
+    below score_cutoff let RapidFuzz stop early; lines with no candidate
+    reaching it are rescored without a cutoff, so every line still gets its
+    best match.
+    """
+    word_offsets = reference["word_offsets"]
+
+    groups = {}
+    for i, norm_line in enumerate(norm_lines):
+        groups.setdefault(len(norm_line.split()), []).append(i)
+
+    matches = [None] * len(norm_lines)
+    for base_size, rows in groups.items():
+        window_sizes = [s for s in (base_size-1, base_size, base_size+1) if s > 0]
+        windows = [get_windows(reference, s) for s in window_sizes]
+        candidates = [w for win in windows for w in win["text"]]
+        candidate_words = [i for win in windows for i in win["first_word"]]
+
+        if len(candidates) >= PREFILTER_MIN_CANDIDATES:
+            candidate_counts = np.concatenate([win["letter_counts"] for win in windows], axis=1)
+            candidate_lengths = np.concatenate([win["length"] for win in windows])
+            for i in rows:
+                col = best_candidate_prefiltered(norm_lines[i], candidates, candidate_counts, candidate_lengths)
+                match = candidates[col]
+                matches[i] = (match, fuzz.ratio(norm_lines[i], match), word_offsets[candidate_words[col]])
+            continue
+
+        for b in range(0, len(rows), CDIST_BATCH_SIZE):
+            batch = rows[b:b+CDIST_BATCH_SIZE]
+            scores = cdist([norm_lines[i] for i in batch], candidates, scorer=fuzz.ratio, processor=None,
+                           score_cutoff=score_cutoff, workers=CDIST_WORKERS, dtype=np.float32)
+            for i, row in zip(batch, scores):
+                if score_cutoff and not row.any():
+                    row = cdist([norm_lines[i]], candidates, scorer=fuzz.ratio, processor=None,
+                                workers=CDIST_WORKERS, dtype=np.float32)[0]
+                col = row.argmax()
+                match = candidates[col]
+                # Rescore the winner so the reported score keeps full precision
+                matches[i] = (match, fuzz.ratio(norm_lines[i], match), word_offsets[candidate_words[col]])
+    return matches
 
 # --- Align OCR lines ---
-def align_ocr_lines(ocr_lines, reference_text, outdir, threshold=70, verbose=True):
-    """Align OCR lines with reference text using fuzzy matching."""
+def align_ocr_lines(ocr_lines, reference_text, outdir, threshold=70, verbose=True, reference=None):
+    """Align OCR lines with reference text using fuzzy matching.
+
+    Pass a reference from prepare_reference() to reuse its normalized text and
+    windows; reference_text is then ignored.
+    """
     os.makedirs(outdir, exist_ok=True)
-    ref_norm = normalize_hebrew(reference_text)
+    if reference is None:
+        reference = prepare_reference(reference_text)
     results = []
     confusion_log = []
 
@@ -232,29 +384,21 @@ def align_ocr_lines(ocr_lines, reference_text, outdir, threshold=70, verbose=Tru
     txt_path = os.path.join(outdir, f"alignment_{uid}.txt")
     confusion_path = os.path.join(outdir, f"confusions_{uid}.csv")
 
-    with open(csv_path, "w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow(["OCR Line", "Best Match", "Score", "Start Index", "Final Match"])
-
-        for line in ocr_lines:
-            norm_line = normalize_hebrew(line)
-            ocr_tokens = norm_line.split()
-            base_size = len(ocr_tokens)
-            window_sizes = [s for s in (base_size-1, base_size, base_size+1) if s > 0]
-            candidates = []
-            for w in window_sizes:
-                candidates.extend(build_windows(ref_norm, w))
-            candidates = list(dict.fromkeys(candidates))
+    norm_lines = [normalize_hebrew(line) for line in ocr_lines]
+    matches = best_matches(norm_lines, reference, score_cutoff=threshold)
 
-            match, score, idx = process.extractOne(norm_line, candidates, scorer=fuzz.ratio)
-            start_index = ref_norm.find(match)
+    for line, norm_line, (match, score, start_index) in zip(ocr_lines, norm_lines, matches):
+        # Track confusions (the match is normalized, so diff the normalized line)
+        diff_strings(norm_line, match, confusion_log)
 
-            # Track confusions
-            diff_strings(line, match, confusion_log)
+        final_match = match
+        results.append((line, match, score, start_index, final_match))
 
-            final_match = match
-            results.append((line, match, score, start_index, final_match))
-            writer.writerow([line, match, score, start_index, final_match])
+    # Save alignment log in one go once all lines are aligned
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["OCR Line", "Best Match", "Score", "Start Index", "Final Match"])
+        writer.writerows(results)
 
     # Save matched text
     with open(txt_path, "w", encoding="utf-8") as f:
@@ -262,11 +406,11 @@ def align_ocr_lines(ocr_lines, reference_text, outdir, threshold=70, verbose=Tru
             f.write(final_match + "\n")
 
     # Save confusion stats
-    confusion_counts = Counter(confusion_log)
+    confusion_counts = Counter(confusion_log).most_common()  # sorted once, reused for the report
     with open(confusion_path, "w", newline="", encoding="utf-8") as f:
         writer = csv.writer(f)
         writer.writerow(["Confused Char", "Confused With", "Count"])
-        for (c, cw), count in confusion_counts.most_common():
+        for (c, cw), count in confusion_counts:
             writer.writerow([c, cw, count])
 
     # --- Summary Report ---
@@ -282,12 +426,12 @@ def align_ocr_lines(ocr_lines, reference_text, outdir, threshold=70, verbose=Tru
         print(f"- Low-confidence (<{threshold}): {low_conf} lines ({low_conf_pct:.1f}%)")
 
         print("\n🔝 Top 5 Confusions:")
-        for (c, cw), count in confusion_counts.most_common(5):
+        for (c, cw), count in confusion_counts[:5]:
             print(f"  {c or '∅'} → {cw or '∅'} : {count} times")
 
     return results, csv_path, txt_path, confusion_path
 
-def process_pagexml_file(xml_path, reference_text, output_dir, threshold=70, verbose=True):
+def process_pagexml_file(xml_path, reference_text, output_dir, threshold=70, verbose=True, reference=None):
     """Process a single PAGE-XML file."""
     if verbose:
         print(f"\n🔄 Processing: {xml_path}")
@@ -306,7 +450,7 @@ def process_pagexml_file(xml_path, reference_text, output_dir, threshold=70, ver
     
     # Align OCR lines
     alignment_results, csv_path, txt_path, confusion_path = align_ocr_lines(
-        ocr_lines, reference_text, output_dir, threshold, verbose
+        ocr_lines, reference_text, output_dir, threshold, verbose, reference
     )
     
     # Update PAGE-XML with aligned text
@@ -334,14 +478,35 @@ def process_pagexml_file(xml_path, reference_text, output_dir, threshold=70, ver
     
     return None
 
+# --- Parallel batch processing ---
+_worker_reference = None
+
+def _init_worker(reference):
+    """Receive the prepared reference once per worker process instead of once per file.
+
+    The worker keeps filling the reference's window cache, so windows built for
+    one file are reused by every later file the worker processes.
+    """
+    global _worker_reference, CDIST_WORKERS
+    _worker_reference = reference
+    # Files already run in parallel, so keep each worker's cdist single-threaded
+    CDIST_WORKERS = 1
+
+def _process_pagexml_file_in_worker(xml_path, output_dir, threshold):
+    """Process a single PAGE-XML file inside a worker process."""
+    return process_pagexml_file(xml_path, None, output_dir, threshold, verbose=False, reference=_worker_reference)
+
 def process_pagexml_directory(input_path, reference_text, output_dir, threshold=70):
     """Process a directory of PAGE-XML files."""
     input_path = Path(input_path)
     console = Console()
     
+    # Normalize the reference once for every file instead of once per file
+    reference = prepare_reference(reference_text)
+    
     if input_path.is_file():
         # Single file - use verbose output
-        return [process_pagexml_file(str(input_path), reference_text, output_dir, threshold, verbose=True)]
+        return [process_pagexml_file(str(input_path), None, output_dir, threshold, verbose=True, reference=reference)]
     
     xml_files = list(input_path.glob("*.xml"))
     if not xml_files:
@@ -358,15 +523,35 @@ def process_pagexml_directory(input_path, reference_text, output_dir, threshold=
         TimeElapsedColumn(),
         TimeRemainingColumn(),
         console=console,
+        refresh_per_second=4,
+        transient=True,
     ) as progress:
         task = progress.add_task("Processing PAGE-XML files...", total=len(xml_files))
         
+        # Files are independent, so align them in parallel and advance the bar as each completes
+        file_results = {}
+        with ProcessPoolExecutor(
+            max_workers=min(len(xml_files), os.cpu_count() or 1),
+            initializer=_init_worker,
+            initargs=(reference,),
+        ) as executor:
+            futures = {
+                executor.submit(_process_pagexml_file_in_worker, str(xml_file), output_dir, threshold): xml_file
+                for xml_file in xml_files
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                xml_file = futures[future]
+                file_results[xml_file] = future.result()
+                # Only rename the task every few files; the bar itself advances on every completion
+                if done % 10 == 0 or done == len(xml_files):
+                    progress.update(task, advance=1, description=f"Processed {xml_file.name}")
+                else:
+                    progress.update(task, advance=1)
+
+        # Keep results in input order regardless of completion order
         for xml_file in xml_files:
-            progress.update(task, description=f"Processing {xml_file.name}")
-            result = process_pagexml_file(str(xml_file), reference_text, output_dir, threshold, verbose=False)
-            if result:
-                results.append(result)
-            progress.advance(task)
+            if file_results[xml_file]:
+                results.append(file_results[xml_file])
     
     return results
 
@@ -1,39 +1,157 @@
 import re
+import unicodedata
 import csv
 import argparse
 import uuid
 import os
-from rapidfuzz import process, fuzz
-import difflib
+import numpy as np
+from rapidfuzz import fuzz
+from rapidfuzz.process import cdist
+from rapidfuzz.distance import Levenshtein
 from collections import Counter
 
 # --- Normalization ---
+_HEBREW_STRIP = re.compile(r"[^\u0590-\u05FF\s]")  # everything except Hebrew letters + spaces
+
 def normalize_hebrew(text):
-    text = re.sub(r"[^\u0590-\u05FF\s]", "", text)  # keep only Hebrew letters + spaces
-    return text.strip()
+    # NFC first: presentation forms like U+FB2A become letter + point, not stripped
+    return _HEBREW_STRIP.sub("", unicodedata.normalize("NFC", text)).strip()
 
 # --- Build candidate windows ---
-def build_windows(reference_text, window_size):
-    words = reference_text.split()
-    return [" ".join(words[i:i+window_size]) for i in range(len(words)-window_size+1)]
+def build_unique_windows(words, window_size):
+    # Repeated phrases yield identical windows; keep each distinct string once,
+    # with the index of the word where it first occurs
+    # (windows of different sizes never collide, they differ in word count)
+    first_word = {}
+    for i in range(len(words)-window_size+1):
+        first_word.setdefault(" ".join(words[i:i+window_size]), i)
+    return list(first_word), list(first_word.values())
 
 # --- Character-level diff + confusion tracking ---
 def diff_strings(ocr, ref, confusion_log):
-    diff = list(difflib.ndiff(ocr, ref))
-    i = 0
-    while i < len(diff):
-        d = diff[i]
-        if d.startswith("-"):
-            if i+1 < len(diff) and diff[i+1].startswith("+"):
-                ocr_char = d[-1]
-                ref_char = diff[i+1][-1]
-                confusion_log.append((ocr_char, ref_char))
-                i += 1
-            else:
-                confusion_log.append((d[-1], ""))  # deletion
-        elif d.startswith("+"):
-            confusion_log.append(("", d[-1]))  # insertion
-        i += 1
+    for op in Levenshtein.editops(ocr, ref):
+        if op.tag == "replace":
+            confusion_log.append((ocr[op.src_pos], ref[op.dest_pos]))
+        elif op.tag == "delete":
+            confusion_log.append((ocr[op.src_pos], ""))  # deletion
+        elif op.tag == "insert":
+            confusion_log.append(("", ref[op.dest_pos]))  # insertion
+
+# --- Bag-of-letters prefilter ---
+# Every insertion or deletion changes one letter count by one, so the L1
+# distance between two letter histograms is a lower bound on their Indel
+# distance and gives an upper bound on fuzz.ratio without running the scorer.
+# Final forms get their own bins; space and "anything else" get one bin each.
+HEBREW_LETTERS = "אבגדהוזחטיךכלםמןנסעףפץצקרשת"
+SPACE_BIN = len(HEBREW_LETTERS)
+OTHER_BIN = SPACE_BIN + 1
+N_BINS = OTHER_BIN + 1
+PREFILTER_TOP_K = 64              # windows scored first to seed the best score
+PREFILTER_MIN_CANDIDATES = 4096   # smaller candidate lists are cheaper to score in full
+
+_HEBREW_BLOCK_BINS = np.full(0x70, OTHER_BIN, dtype=np.intp)  # U+0590..U+05FF -> bin
+for _bin, _letter in enumerate(HEBREW_LETTERS):
+    _HEBREW_BLOCK_BINS[ord(_letter) - 0x0590] = _bin
+
+def letter_bins(text):
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+    bins = np.full(len(codes), OTHER_BIN, dtype=np.intp)
+    in_block = (codes >= 0x0590) & (codes < 0x0600)
+    bins[in_block] = _HEBREW_BLOCK_BINS[codes[in_block] - 0x0590]
+    bins[codes == 0x20] = SPACE_BIN
+    return bins
+
+def cumulative_letter_counts(words):
+    # Row i+s minus row i is the histogram of words[i:i+s], without the joining spaces
+    word_ids = np.repeat(np.arange(len(words)), [len(w) for w in words])
+    counts = np.bincount(word_ids * N_BINS + letter_bins("".join(words)), minlength=len(words) * N_BINS)
+    cumulative = np.zeros((len(words) + 1, N_BINS), dtype=np.int32)
+    np.cumsum(counts.reshape(len(words), N_BINS), axis=0, out=cumulative[1:])
+    return cumulative
+
+def window_letter_counts(cumulative, first_word, window_size):
+    # One column per window (bins x windows) so each bin is a contiguous row
+    starts = np.asarray(first_word, dtype=np.intp)
+    counts = cumulative[starts + window_size] - cumulative[starts]
+    counts[:, SPACE_BIN] += window_size - 1
+    return np.ascontiguousarray(counts.T, dtype=np.int16)
+
+def best_candidate_prefiltered(query, candidates, candidate_counts, candidate_lengths):
+    # Score the top PREFILTER_TOP_K windows by bound first; any window whose
+    # bound is below that score cannot win and is never scored. Same result as
+    # scoring every candidate, including ties resolving to the first one.
+    query_counts = np.bincount(letter_bins(query), minlength=N_BINS).astype(np.int16)
+    distance = np.zeros(len(candidates), dtype=np.int16)
+    for b in range(N_BINS):
+        distance += np.abs(candidate_counts[b] - query_counts[b])
+    bound = 100 * (1 - distance / (candidate_lengths + len(query)))
+
+    # Only a handful of windows are scored here, too few to be worth cdist threads
+    top = np.argpartition(bound, -PREFILTER_TOP_K)[-PREFILTER_TOP_K:]
+    best = cdist([query], [candidates[j] for j in top], scorer=fuzz.ratio, processor=None,
+                 workers=1, dtype=np.float64).max()
+
+    survivors = np.flatnonzero(bound >= best - 1e-6)
+    scores = cdist([query], [candidates[j] for j in survivors], scorer=fuzz.ratio, processor=None,
+                   workers=1, dtype=np.float64)[0]
+    return survivors[scores.argmax()]
+
+# --- Batched fuzzy matching ---
+CDIST_BATCH_SIZE = 64  # OCR lines scored per cdist call (bounds the score matrix size)
+
+def best_matches(norm_lines, ref_norm, score_cutoff=0):
+    # Lines with the same token count share the same candidate windows
+    # (base-1, base, base+1), so each group is scored with batched cdist calls;
+    # large candidate lists go through the bag-of-letters prefilter line by line.
+    # Returns (match, score, start index in ref_norm) per line. Scores below
+    # score_cutoff let RapidFuzz stop early; lines with no candidate reaching
+    # it are rescored without a cutoff, so every line still gets its best match.
+    ref_words = ref_norm.split()
+    # Character offset of every word, so a window's position is known without
+    # searching ref_norm for it (words may be separated by any whitespace)
+    word_offsets = [m.start() for m in re.finditer(r"\S+", ref_norm)]
+    letter_counts = cumulative_letter_counts(ref_words)
+
+    groups = {}
+    for i, norm_line in enumerate(norm_lines):
+        groups.setdefault(len(norm_line.split()), []).append(i)
+
+    matches = [None] * len(norm_lines)
+    # window size -> (distinct windows, first word index, letter histograms, lengths),
+    # shared by neighbouring groups
+    windows = {}
+    for base_size, rows in groups.items():
+        window_sizes = [s for s in (base_size-1, base_size, base_size+1) if s > 0]
+        for s in window_sizes:
+            if s not in windows:
+                text, first_word = build_unique_windows(ref_words, s)
+                counts = window_letter_counts(letter_counts, first_word, s)
+                windows[s] = (text, first_word, counts, counts.sum(axis=0, dtype=np.int32))
+        candidates = [w for s in window_sizes for w in windows[s][0]]
+        candidate_words = [i for s in window_sizes for i in windows[s][1]]
+
+        if len(candidates) >= PREFILTER_MIN_CANDIDATES:
+            candidate_counts = np.concatenate([windows[s][2] for s in window_sizes], axis=1)
+            candidate_lengths = np.concatenate([windows[s][3] for s in window_sizes])
+            for i in rows:
+                col = best_candidate_prefiltered(norm_lines[i], candidates, candidate_counts, candidate_lengths)
+                match = candidates[col]
+                matches[i] = (match, fuzz.ratio(norm_lines[i], match), word_offsets[candidate_words[col]])
+            continue
+
+        for b in range(0, len(rows), CDIST_BATCH_SIZE):
+            batch = rows[b:b+CDIST_BATCH_SIZE]
+            scores = cdist([norm_lines[i] for i in batch], candidates, scorer=fuzz.ratio, processor=None,
+                           score_cutoff=score_cutoff, workers=-1, dtype=np.float32)
+            for i, row in zip(batch, scores):
+                if score_cutoff and not row.any():
+                    row = cdist([norm_lines[i]], candidates, scorer=fuzz.ratio, processor=None,
+                                workers=-1, dtype=np.float32)[0]
+                col = row.argmax()
+                match = candidates[col]
+                # Rescore the winner so the reported score keeps full precision
+                matches[i] = (match, fuzz.ratio(norm_lines[i], match), word_offsets[candidate_words[col]])
+    return matches
 
 # --- Align OCR lines ---
 def align_ocr_lines(ocr_lines, reference_text, outdir, threshold=70):
@@ -47,31 +165,21 @@ def align_ocr_lines(ocr_lines, reference_text, outdir, threshold=70):
     txt_path = os.path.join(outdir, f"alignment_{uid}.txt")
     confusion_path = os.path.join(outdir, f"confusions_{uid}.csv")
 
-    with open(csv_path, "w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow(["OCR Line", "Best Match", "Score", "Start Index", "Final Match"])
-
-        for line in ocr_lines:
-            norm_line = normalize_hebrew(line)
-            #window_size = max(1, len(norm_line.split()))
-            #candidates = build_windows(ref_norm, window_size)
-            ocr_tokens = norm_line.split()
-            base_size = len(ocr_tokens)
-            window_sizes = [s for s in (base_size-1, base_size, base_size+1) if s > 0]
-            candidates = []
-            for w in window_sizes:
-                candidates.extend(build_windows(ref_norm, w))
-            candidates = list(dict.fromkeys(candidates))
+    norm_lines = [normalize_hebrew(line) for line in ocr_lines]
+    matches = best_matches(norm_lines, ref_norm, score_cutoff=threshold)
 
-            match, score, idx = process.extractOne(norm_line, candidates, scorer=fuzz.ratio)
-            start_index = ref_norm.find(match)
+    for line, norm_line, (match, score, start_index) in zip(ocr_lines, norm_lines, matches):
+        # Track confusions (the match is normalized, so diff the normalized line)
+        diff_strings(norm_line, match, confusion_log)
 
-            # Track confusions
-            diff_strings(line, match, confusion_log)
+        final_match = match
+        results.append((line, match, score, start_index, final_match))
 
-            final_match = match
-            results.append((line, match, score, start_index, final_match))
-            writer.writerow([line, match, score, start_index, final_match])
+    # Save alignment log in one go once all lines are aligned
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["OCR Line", "Best Match", "Score", "Start Index", "Final Match"])
+        writer.writerows(results)
 
     # Sort by Torah position
     #results.sort(key=lambda x: x[3])
@@ -82,11 +190,11 @@ def align_ocr_lines(ocr_lines, reference_text, outdir, threshold=70):
             f.write(final_match + "\n")
 
     # Save confusion stats
-    confusion_counts = Counter(confusion_log)
+    confusion_counts = Counter(confusion_log).most_common()  # sorted once, reused for the report
     with open(confusion_path, "w", newline="", encoding="utf-8") as f:
         writer = csv.writer(f)
         writer.writerow(["Confused Char", "Confused With", "Count"])
-        for (c, cw), count in confusion_counts.most_common():
+        for (c, cw), count in confusion_counts:
             writer.writerow([c, cw, count])
 
     # --- Summary Report ---
@@ -101,7 +209,7 @@ def align_ocr_lines(ocr_lines, reference_text, outdir, threshold=70):
     print(f"- Low-confidence (<{threshold}): {low_conf} lines ({low_conf_pct:.1f}%)")
 
     print("\n🔝 Top 5 Confusions:")
-    for (c, cw), count in confusion_counts.most_common(5):
+    for (c, cw), count in confusion_counts[:5]:
         print(f"  {c or '∅'} → {cw or '∅'} : {count} times")
 
     return results, csv_path, txt_path, confusion_path
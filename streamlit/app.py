@@ -1,98 +1,268 @@
 import streamlit as st
 import re
+import unicodedata
 import os
 import uuid
 import csv
-from rapidfuzz import process, fuzz
-import difflib
+import html
+import io
+import numpy as np
+from rapidfuzz import fuzz
+from rapidfuzz.process import cdist
+from rapidfuzz.distance import Levenshtein
 from collections import Counter
+from itertools import accumulate, chain
 
 # --- Normalization ---
+_HEBREW_STRIP = re.compile(r"[^\u0590-\u05FF\s]")  # everything except Hebrew letters + spaces
+
+# NFC first: presentation forms like U+FB2A become letter + point, not stripped
 def normalize_hebrew(text):
-    text = re.sub(r"[^\u0590-\u05FF\s]", "", text)
-    return text.strip()
+    return _HEBREW_STRIP.sub("", unicodedata.normalize("NFC", text)).strip()
 
 # --- Build candidate windows ---
-def build_windows(reference_text, window_size):
-    words = reference_text.split()
-    return [" ".join(words[i:i+window_size]) for i in range(len(words)-window_size+1)]
+def word_starts(words):
+    # Offset of every word in " ".join(words), plus one past the end, so the
+    # window words[i:i+s] is the slice joined[starts[i]:starts[i+s]-1]
+    return [0, *accumulate(len(w) + 1 for w in words)]
+
+def build_unique_windows(joined, starts, window_size):
+    # Repeated phrases yield identical windows; keep each distinct string once,
+    # with the index of the word where it first occurs
+    # (windows of different sizes never collide, they differ in word count)
+    first_word = {}
+    for i in range(len(starts)-window_size):
+        first_word.setdefault(joined[starts[i]:starts[i+window_size]-1], i)
+    return list(first_word), list(first_word.values())
 
 # --- Character-level diff + confusion tracking ---
-def diff_strings(ocr, ref, confusion_log):
-    diff = list(difflib.ndiff(ocr, ref))
-    out = []
-    i = 0
-    while i < len(diff):
-        d = diff[i]
-        if d.startswith(" "):
-            out.append(d[-1])
-        elif d.startswith("-"):
-            # check if next is a "+"
-            if i+1 < len(diff) and diff[i+1].startswith("+"):
-                ocr_char = d[-1]
-                ref_char = diff[i+1][-1]
-                out.append(f":red[{ocr_char}]")
-                out.append(f":green[{ref_char}]")
-                confusion_log.append((ocr, ref, ocr_char, ref_char))
-                i += 1  # skip the paired "+"
-            else:
-                out.append(f":red[{d[-1]}]")
-                confusion_log.append((ocr, ref, d[-1], ""))  # deletion only
-        elif d.startswith("+"):
-            out.append(f":green[{d[-1]}]")
-            confusion_log.append((ocr, ref, "", d[-1]))  # insertion only
-        i += 1
-    return "".join(out)
+HTML_RED = '<span style="color:red;font-weight:bold">{}</span>'
+HTML_GREEN = '<span style="color:green;font-weight:bold">{}</span>'
 
-def diff_strings_html(ocr, ref, confusion_log):
-    diff = list(difflib.ndiff(ocr, ref))
+CONFUSION_EXAMPLES = 3  # line numbers kept per confused char pair
+
+def diff_strings(ocr, ref, line_num, confusion_counts, confusion_examples, red_fmt=":red[{}]", green_fmt=":green[{}]", escape=str):
+    # OCR-only chars are wrapped with red_fmt, reference-only chars with green_fmt;
+    # all text from the two lines goes through escape first.
+    # Confusions are counted per (OCR char, reference char) pair ("" for a pure
+    # deletion/insertion); only the numbers of a few example lines are kept,
+    # the line text is looked up from the results when the CSV is written.
+    # Callers pass the number of a line's first copy, so repeats add no example
     out = []
-    i = 0
-    while i < len(diff):
-        d = diff[i]
-        if d.startswith(" "):
-            out.append(d[-1])
-        elif d.startswith("-"):
-            # check if next is a "+"
-            if i+1 < len(diff) and diff[i+1].startswith("+"):
-                ocr_char = d[-1]
-                ref_char = diff[i+1][-1]
-                out.append(f'<span style="color:red;font-weight:bold">{ocr_char}</span>')
-                out.append(f'<span style="color:green;font-weight:bold">{ref_char}</span>')
-                confusion_log.append((ocr, ref, ocr_char, ref_char))
-                i += 1  # skip the paired "+"
-            else:
-                out.append(f'<span style="color:red;font-weight:bold">{d[-1]}</span>')
-                confusion_log.append((ocr, ref, d[-1], ""))  # deletion only
-        elif d.startswith("+"):
-            out.append(f'<span style="color:green;font-weight:bold">{d[-1]}</span>')
-            confusion_log.append((ocr, ref, "", d[-1]))  # insertion only
-        i += 1
+    i = 0  # next OCR char not yet emitted
+    # Plain (tag, src_pos, dest_pos) tuples are cheaper to unpack than Editop attributes
+    for tag, src_pos, dest_pos in Levenshtein.editops(ocr, ref).as_list():
+        out.append(escape(ocr[i:src_pos]))
+        if tag == "insert":
+            key = ("", ref[dest_pos])
+            out.append(green_fmt.format(escape(key[1])))
+            i = src_pos
+        elif tag == "delete":
+            key = (ocr[src_pos], "")
+            out.append(red_fmt.format(escape(key[0])))
+            i = src_pos + 1
+        else:
+            key = (ocr[src_pos], ref[dest_pos])
+            out.append(red_fmt.format(escape(key[0])))
+            out.append(green_fmt.format(escape(key[1])))
+            i = src_pos + 1
+        confusion_counts[key] += 1
+        examples = confusion_examples.get(key)
+        if examples is None:
+            confusion_examples[key] = [line_num]
+        elif len(examples) < CONFUSION_EXAMPLES and line_num not in examples:
+            examples.append(line_num)
+    out.append(escape(ocr[i:]))
     return "".join(out)
 
+def diff_strings_html(ocr, ref, line_num, confusion_counts, confusion_examples):
+    return diff_strings(ocr, ref, line_num, confusion_counts, confusion_examples, HTML_RED, HTML_GREEN, html.escape)
+
+# --- Bag-of-letters prefilter ---
+# Every insertion or deletion changes one letter count by one, so the L1
+# distance between two letter histograms is a lower bound on their Indel
+# distance and gives an upper bound on fuzz.ratio without running the scorer.
+# Final forms get their own bins; space and "anything else" get one bin each.
+HEBREW_LETTERS = "אבגדהוזחטיךכלםמןנסעףפץצקרשת"
+SPACE_BIN = len(HEBREW_LETTERS)
+OTHER_BIN = SPACE_BIN + 1
+N_BINS = OTHER_BIN + 1
+PREFILTER_TOP_K = 64              # windows scored first to seed the best score
+PREFILTER_MIN_CANDIDATES = 4096   # smaller candidate lists are cheaper to score in full
+
+_HEBREW_BLOCK_BINS = np.full(0x70, OTHER_BIN, dtype=np.intp)  # U+0590..U+05FF -> bin
+for _bin, _letter in enumerate(HEBREW_LETTERS):
+    _HEBREW_BLOCK_BINS[ord(_letter) - 0x0590] = _bin
+
+def letter_bins(text):
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+    bins = np.full(len(codes), OTHER_BIN, dtype=np.intp)
+    in_block = (codes >= 0x0590) & (codes < 0x0600)
+    bins[in_block] = _HEBREW_BLOCK_BINS[codes[in_block] - 0x0590]
+    bins[codes == 0x20] = SPACE_BIN
+    return bins
+
+def cumulative_letter_counts(words):
+    # Row i+s minus row i is the histogram of words[i:i+s], without the joining spaces
+    word_ids = np.repeat(np.arange(len(words)), [len(w) for w in words])
+    counts = np.bincount(word_ids * N_BINS + letter_bins("".join(words)), minlength=len(words) * N_BINS)
+    cumulative = np.zeros((len(words) + 1, N_BINS), dtype=np.int32)
+    np.cumsum(counts.reshape(len(words), N_BINS), axis=0, out=cumulative[1:])
+    return cumulative
+
+def window_letter_counts(cumulative, first_word, window_size):
+    # One column per window (bins x windows) so each bin is a contiguous row
+    starts = np.asarray(first_word, dtype=np.intp)
+    counts = cumulative[starts + window_size] - cumulative[starts]
+    counts[:, SPACE_BIN] += window_size - 1
+    return np.ascontiguousarray(counts.T, dtype=np.int16)
+
+def best_candidate_prefiltered(query, candidates, candidate_counts, candidate_lengths):
+    # Score the top PREFILTER_TOP_K windows by bound first; any window whose
+    # bound is below that score cannot win and is never scored. Same result as
+    # scoring every candidate, including ties resolving to the first one.
+    query_counts = np.bincount(letter_bins(query), minlength=N_BINS).astype(np.int16)
+    distance = np.zeros(len(candidates), dtype=np.int16)
+    for b in range(N_BINS):
+        distance += np.abs(candidate_counts[b] - query_counts[b])
+    bound = 100 * (1 - distance / (candidate_lengths + len(query)))
+
+    # Only a handful of windows are scored here, too few to be worth cdist threads
+    top = np.argpartition(bound, -PREFILTER_TOP_K)[-PREFILTER_TOP_K:]
+    best = cdist([query], [candidates[j] for j in top], scorer=fuzz.ratio, processor=None,
+                 workers=1, dtype=np.float64).max()
+
+    survivors = np.flatnonzero(bound >= best - 1e-6)
+    scores = cdist([query], [candidates[j] for j in survivors], scorer=fuzz.ratio, processor=None,
+                   workers=1, dtype=np.float64)[0]
+    return survivors[scores.argmax()]
+
+# --- Cached reference data ---
+# Streamlit reruns the whole script on every widget interaction; these only
+# depend on their arguments, so reruns with the same reference reuse them
+REFERENCE_CACHE_ENTRIES = 8  # reference texts kept in memory at once
+NORMALIZED_CACHE_ENTRIES = 2  # normalized references (and their letter counts) kept at once
+WINDOW_CACHE_ENTRIES = 24     # (reference, window size) tables kept; ~16 MB each for ref/
+ALIGNMENT_CACHE_ENTRIES = 4   # recent alignments kept for re-runs of the same input
+
+# The modification time is part of the key, so an edited file is reread and an
+# unchanged one never is; strings are immutable, so sharing one copy is safe.
+# max_entries evicts the least recently used entries, including stale mtimes
+@st.cache_resource(show_spinner=False, max_entries=REFERENCE_CACHE_ENTRIES)
+def load_reference(path, mtime):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def list_references(ref_dir, mtime):
+    return [f for f in os.listdir(ref_dir) if f.endswith(".txt")]
+
+@st.cache_data(show_spinner=False, max_entries=NORMALIZED_CACHE_ENTRIES)
+def normalized_reference(reference_text):
+    return normalize_hebrew(reference_text)
+
+@st.cache_resource(show_spinner=False, max_entries=NORMALIZED_CACHE_ENTRIES)
+def reference_letter_counts(ref_norm):
+    # Read-only and large, so shared as is rather than copied out like cache_data results
+    return cumulative_letter_counts(ref_norm.split())
+
+@st.cache_resource(show_spinner=False, max_entries=WINDOW_CACHE_ENTRIES)
+def reference_windows(ref_norm, window_size):
+    # (distinct windows, first word index, letter histograms, lengths) for one size.
+    # Shared read-only like the letter counts; callers copy what they combine.
+    # Windows are sliced out of the joined reference rather than re-joined word by word
+    words = ref_norm.split()
+    text, first_word = build_unique_windows(" ".join(words), word_starts(words), window_size)
+    counts = window_letter_counts(reference_letter_counts(ref_norm), first_word, window_size)
+    return text, first_word, counts, counts.sum(axis=0, dtype=np.int32)
+
+# --- Batched fuzzy matching ---
+CDIST_BATCH_SIZE = 64  # OCR lines scored per cdist call (bounds the score matrix size)
+
+def best_matches(norm_lines, ref_norm, score_cutoff=0):
+    # Lines with the same token count share the same candidate windows
+    # (base-1, base, base+1), so each group is scored with batched cdist calls
+    # instead of one extractOne per line; large candidate lists go through the
+    # bag-of-letters prefilter line by line. Returns (match, score, index of the
+    # match's first word) per line. Scores below score_cutoff let RapidFuzz stop
+    # early; lines with no candidate reaching it are rescored without a cutoff,
+    # so every line still gets its best match.
+    # Repeated lines (running headers, footers) normalize to the same text;
+    # score each distinct line once and hand the result to every copy
+    unique_lines = list(dict.fromkeys(norm_lines))
+    if len(unique_lines) < len(norm_lines):
+        by_line = dict(zip(unique_lines, best_matches(unique_lines, ref_norm, score_cutoff)))
+        return [by_line[norm_line] for norm_line in norm_lines]
+
+    groups = {}
+    for i, norm_line in enumerate(norm_lines):
+        groups.setdefault(len(norm_line.split()), []).append(i)
+
+    matches = [None] * len(norm_lines)
+    # The reference is fixed for the whole run, so the distinct windows only
+    # need to be built once per size and are shared by neighbouring groups
+    windows = {}
+    for base_size, rows in groups.items():
+        window_sizes = [s for s in (base_size-1, base_size, base_size+1) if s > 0]
+        for s in window_sizes:
+            if s not in windows:
+                windows[s] = reference_windows(ref_norm, s)
+        # Sizes never share a window and each size is already deduplicated,
+        # so the group's candidates are just the per-size lists back to back
+        candidates = list(chain.from_iterable(windows[s][0] for s in window_sizes))
+        candidate_words = list(chain.from_iterable(windows[s][1] for s in window_sizes))
+
+        if len(candidates) >= PREFILTER_MIN_CANDIDATES:
+            candidate_counts = np.concatenate([windows[s][2] for s in window_sizes], axis=1)
+            candidate_lengths = np.concatenate([windows[s][3] for s in window_sizes])
+            for i in rows:
+                col = best_candidate_prefiltered(norm_lines[i], candidates, candidate_counts, candidate_lengths)
+                match = candidates[col]
+                matches[i] = (match, fuzz.ratio(norm_lines[i], match), candidate_words[col])
+            continue
+
+        for b in range(0, len(rows), CDIST_BATCH_SIZE):
+            batch = rows[b:b+CDIST_BATCH_SIZE]
+            scores = cdist([norm_lines[i] for i in batch], candidates, scorer=fuzz.ratio, processor=None,
+                           score_cutoff=score_cutoff, workers=-1, dtype=np.float32)
+            for i, row in zip(batch, scores):
+                if score_cutoff and not row.any():
+                    row = cdist([norm_lines[i]], candidates, scorer=fuzz.ratio, processor=None,
+                                workers=-1, dtype=np.float32)[0]
+                col = row.argmax()
+                match = candidates[col]
+                # Rescore the winner so the reported score keeps full precision
+                matches[i] = (match, fuzz.ratio(norm_lines[i], match), candidate_words[col])
+    return matches
+
 # --- Align OCR lines ---
+# Cached as a whole, so re-running the same OCR text against the same reference is free
+@st.cache_data(show_spinner=False, max_entries=ALIGNMENT_CACHE_ENTRIES)
 def align_ocr_lines(ocr_lines, reference_text, threshold):
-    ref_norm = normalize_hebrew(reference_text)
+    ref_norm = normalized_reference(reference_text)
     results = []
-    confusion_log = []
+    confusion_counts = Counter()
+    confusion_examples = {}
 
-    for line_num, line in enumerate(ocr_lines, start=1):
-        norm_line = normalize_hebrew(line)
-        ocr_tokens = norm_line.split()
-        base_size = len(ocr_tokens)
+    # Character offset of every word, so a match's position is known without
+    # searching ref_norm for it (words may be separated by any whitespace)
+    word_offsets = [m.start() for m in re.finditer(r"\S+", ref_norm)]
 
-        # Flexible window sizes: allow ±1
-        window_sizes = [s for s in (base_size - 1, base_size, base_size + 1) if s > 0]
-        candidates = []
-        for w in window_sizes:
-            candidates.extend(build_windows(ref_norm, w))
+    norm_lines = [normalize_hebrew(line) for line in ocr_lines]
+    matches = best_matches(norm_lines, ref_norm, score_cutoff=threshold)
+    # Number of the first line with each OCR text; repeated lines (running
+    # headers, footers) are logged as examples under that number only
+    first_line_num = {}
 
-        # remove duplicates
-        candidates = list(dict.fromkeys(candidates))
-        match, score, idx = process.extractOne(norm_line, candidates, scorer=fuzz.ratio)
-        start_index = ref_norm.find(match)
+    for line_num, (line, norm_line, (match, score, first_word)) in enumerate(
+        zip(ocr_lines, norm_lines, matches), start=1
+    ):
+        start_index = word_offsets[first_word]
 
-        diff_str = diff_strings_html(line, match, confusion_log)
+        # The match is normalized, so diff (and count confusions on) the normalized
+        # line; punctuation and digits stripped from the OCR are not confusions
+        example_num = first_line_num.setdefault(line, line_num)
+        diff_str = diff_strings_html(norm_line, match, example_num, confusion_counts, confusion_examples)
         results.append({
             "line_num": line_num,
             "ocr": line,
@@ -104,7 +274,32 @@ def align_ocr_lines(ocr_lines, reference_text, threshold):
         })
 
     #results.sort(key=lambda x: x["index"])
-    return results, confusion_log
+    return results, confusion_counts, confusion_examples
+
+# --- Output files ---
+def build_downloads(results, confusion_counts, confusion_examples):
+    # Alignment CSV, matched text and confusion CSV as UTF-8 bytes, built once
+    # per alignment and handed straight to the download buttons
+    buf = io.StringIO(newline="")
+    writer = csv.writer(buf)
+    writer.writerow(["OCR Line", "Best Match", "Score", "Index", "Final Match"])
+    writer.writerows((r["ocr"], r["match"], r["score"], r["index"], r["final_match"]) for r in results)
+    alignment_csv = buf.getvalue().encode("utf-8")
+
+    matched_text = "".join(r["final_match"] + "\n" for r in results).encode("utf-8")
+
+    buf = io.StringIO(newline="")
+    writer = csv.writer(buf)
+    writer.writerow(["Confused Char", "Confused With", "Count", "Examples"])
+    writer.writerows(
+        (c, cw, count, " | ".join(
+            f"{results[n - 1]['ocr']} → {results[n - 1]['match']}" for n in confusion_examples.get((c, cw), [])
+        ))
+        for (c, cw), count in confusion_counts.most_common()
+    )
+    confusion_csv = buf.getvalue().encode("utf-8")
+
+    return alignment_csv, matched_text, confusion_csv
 
 # --- App state ---
 if "page" not in st.session_state:
@@ -112,18 +307,24 @@ if "page" not in st.session_state:
 if "results" not in st.session_state:
     st.session_state.results = []
 if "confusions" not in st.session_state:
-    st.session_state.confusions = []
+    st.session_state.confusions = Counter()
+if "confusion_examples" not in st.session_state:
+    st.session_state.confusion_examples = {}
+if "downloads" not in st.session_state:
+    st.session_state.downloads = None
+if "dirty" not in st.session_state:
+    st.session_state.dirty = False  # downloads not yet written to aligned/
 if "uuid" not in st.session_state:
     st.session_state.uuid = uuid.uuid4().hex[:8]
 
 # --- UI ---
 st.title("📜 Hebrew OCR Alignment Tool")
 
-ref_files = [f for f in os.listdir("ref") if f.endswith(".txt")]
+ref_files = list_references("ref", os.path.getmtime("ref"))
 selected_ref = st.selectbox("Select reference text", ref_files)
 
-with open(os.path.join("ref", selected_ref), encoding="utf-8") as f:
-    reference_text = f.read()
+ref_path = os.path.join("ref", selected_ref)
+reference_text = load_reference(ref_path, os.path.getmtime(ref_path))
 
 ocr_input = st.text_area("Paste OCR text (line-separated)", height=200)
 uploaded_file = st.file_uploader("Or upload OCR text file", type=["txt"])
@@ -137,9 +338,12 @@ if st.button("Run Alignment"):
     if not ocr_lines:
         st.warning("Please paste or upload OCR text first.")
     else:
-        results, confusion_log = align_ocr_lines(ocr_lines, reference_text, threshold)
+        results, confusion_counts, confusion_examples = align_ocr_lines(ocr_lines, reference_text, threshold)
         st.session_state.results = results
-        st.session_state.confusions = confusion_log
+        st.session_state.confusions = confusion_counts
+        st.session_state.confusion_examples = confusion_examples
+        st.session_state.downloads = build_downloads(results, confusion_counts, confusion_examples)
+        st.session_state.dirty = True
         st.session_state.page = 0
         #st.rerun() # Remove st.rerun() here - let Streamlit naturally rerender
 
@@ -154,17 +358,15 @@ current_page_results = results[start:end]
 if results:
     st.subheader(f"Results (Page {st.session_state.page + 1} of {total_pages})")
 
-    for i, r in enumerate(current_page_results):
-        st.markdown("---")
-        st.markdown(f"**Line {r['line_num']}**")
-        st.markdown(f"OCR: {r['ocr']}")
-        #st.markdown(f"Diff: {diff_strings(r['ocr'], r['match'], st.session_state.confusions)}")
-        st.markdown(f"Diff: {r['diff']}", unsafe_allow_html=True)
-        st.markdown(f"Match: {r['match']} (score {r['score']})")
-
-        # no editing, so just persist match as final_match
-        r["final_match"] = r["match"]
-        st.session_state.results[start + i] = r
+    # One markdown element for the whole page instead of several per row;
+    # the diff is already escaped HTML, the raw lines are escaped here
+    st.markdown("\n".join(
+        f"<hr><b>Line {r['line_num']}</b><br>"
+        f"OCR: {html.escape(r['ocr'])}<br>"
+        f"Diff: {r['diff']}<br>"
+        f"Match: {html.escape(r['match'])} (score {r['score']})"
+        for r in current_page_results
+    ), unsafe_allow_html=True)
 
     # Navigation
     col1, col2, col3 = st.columns([1,2,1])
@@ -180,44 +382,25 @@ if results:
                 st.rerun()
 
     # Save outputs
-    # make sure the directory exists
-    os.makedirs("aligned", exist_ok=True)
     base = os.path.join("aligned", f"alignment_{st.session_state.uuid}")
     csv_path = f"{base}.csv"
     txt_path = f"{base}.txt"
     confusion_path = os.path.join("aligned", f"confusions_{st.session_state.uuid}.csv")
+    alignment_csv, matched_text, confusion_csv = st.session_state.downloads
 
-    with open(csv_path, "w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow(["OCR Line", "Best Match", "Score", "Index", "Final Match"])
-        for r in results:
-            writer.writerow([
-                r["ocr"],
-                r["match"],
-                r["score"],
-                r["index"],
-                r.get("final_match", r["match"])  # <-- safe fallback
-            ])
-
-    with open(txt_path, "w", encoding="utf-8") as f:
-        for r in results:
-            f.write(r.get("final_match", r["match"]) + "\n")
-
-    # Confusion stats
-    confusion_counts = Counter((o, r, c, cw) for o, r, c, cw in st.session_state.confusions)
-    with open(confusion_path, "w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow(["OCR Line", "Reference Line", "Confused Char", "Confused With", "Count"])
-        for (o, r, c, cw), count in confusion_counts.items():
-            writer.writerow([o, r, c, cw, count])
+    # Write the files once per alignment, not on every rerun (pagination, downloads)
+    if st.session_state.dirty:
+        # make sure the directory exists
+        os.makedirs("aligned", exist_ok=True)
+        for path, data in ((csv_path, alignment_csv), (txt_path, matched_text), (confusion_path, confusion_csv)):
+            with open(path, "wb") as f:
+                f.write(data)
+        st.session_state.dirty = False
 
     # Downloads
-    with open(csv_path, "rb") as f:
-        st.download_button("⬇️ Download Alignment CSV", f, file_name=csv_path, mime="text/csv")
-    with open(txt_path, "rb") as f:
-        st.download_button("⬇️ Download Matched Text", f, file_name=txt_path, mime="text/plain")
-    with open(confusion_path, "rb") as f:
-        st.download_button("⬇️ Download Confusion Log", f, file_name=confusion_path, mime="text/csv")
+    st.download_button("⬇️ Download Alignment CSV", alignment_csv, file_name=csv_path, mime="text/csv")
+    st.download_button("⬇️ Download Matched Text", matched_text, file_name=txt_path, mime="text/plain")
+    st.download_button("⬇️ Download Confusion Log", confusion_csv, file_name=confusion_path, mime="text/csv")
 
     st.success("Alignment complete!")
 